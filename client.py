@@ -21,13 +21,18 @@ import argparse
 import os
 import socket
 import sys
+import time
 
-from protocol import send_message, recv_message, send_file_data, recv_file_data, recv_exact
+from protocol import (send_message, recv_message, send_file_data, recv_file_data, recv_exact,
+                      tune_socket)
 
 
 DEFAULT_HOST = "localhost"
 DEFAULT_PORT = 65432
 DOWNLOAD_FOLDER = "./downloads"
+PROGRESS_INTERVAL = 0.05  # Segundos mínimos entre redibujados de la barra
+
+_last_progress = [0.0]
 
 
 def format_size(size: int) -> str:
@@ -41,19 +46,16 @@ def format_size(size: int) -> str:
         return f"{size / (1024 * 1024 * 1024):.1f} GB"
 
 
-def print_entries(entries: list):
-    # Muestra una lista de archivos/carpetas formateada con emojis y columnas
-    if not entries:
+def print_entries(names: list, sizes: list, is_dirs: list):
+    # Muestra una lista de archivos/carpetas formateada con emojis y columnas.
+    # El servidor manda tres listas paralelas (nombre, tamaño, es_directorio)
+    if not names:
         print("  (carpeta vacía)")
         return
 
     print(f"  {'Nombre':<35} {'Tipo':<10} {'Tamaño':<15}")
     print(f"  {'─'*35} {'─'*10} {'─'*15}")
-    for entry in entries:
-        name = entry["name"]
-        is_dir = entry.get("is_dir", False)
-        size = entry.get("size", 0)
-
+    for name, size, is_dir in zip(names, sizes, is_dirs):
         tipo = "📁 DIR" if is_dir else "📄 FILE"
         size_str = "" if is_dir else format_size(size)
         display_name = f"{name}/" if is_dir else name
@@ -78,6 +80,13 @@ def print_help():
 
 
 def print_progress(received: int, total: int):
+    # Se llama por cada chunk recibido: sólo redibuja cada PROGRESS_INTERVAL
+    # (y siempre al llegar al 100%) para no saturar la terminal
+    now = time.monotonic()
+    if received != total and now - _last_progress[0] < PROGRESS_INTERVAL:
+        return
+    _last_progress[0] = now
+
     pct = (received / total) * 100
     bar_len = 30
     filled = int(bar_len * received / total)
@@ -111,6 +120,7 @@ def main():
     except ConnectionRefusedError:
         print("[!] No se pudo conectar al servidor. ¿Está corriendo?")
         sys.exit(1)
+    tune_socket(sock)
 
     # Enviar identificación como JSON
     send_message(sock, {"name": client_name})
@@ -147,7 +157,8 @@ def main():
                 resp = recv_message(sock)
                 if resp and resp["status"] == "ok":
                     print(f"\n  Contenido de '{path}':")
-                    print_entries(resp.get("entries", []))
+                    print_entries(resp.get("names", []), resp.get("sizes", []),
+                                  resp.get("is_dir", []))
                     print()
                 else:
                     print(f"  [!] {resp.get('message', 'Error desconocido')}")
@@ -193,7 +204,8 @@ def main():
                     else:
                         print(f"  [!] {resp.get('message', 'Error')}")
                 else:
-                    print("  [!] Servidor no está listo para recibir")
+                    detail = ready.get("message") if ready else None
+                    print(f"  [!] Servidor no está listo para recibir{f': {detail}' if detail else ''}")
 
             # ── DELETE ──
             elif cmd in ("delete", "rm"):
@@ -239,8 +251,8 @@ def main():
 
     except KeyboardInterrupt:
         print("\n  [*] Ctrl+C - Desconectando...")
-    except (ConnectionResetError, BrokenPipeError):
-        print("\n  [!] Se perdió la conexión con el servidor.")
+    except ConnectionError as e:
+        print(f"\n  [!] Se perdió la conexión con el servidor ({e}).")
     finally:
         sock.close()
         print("  [*] Conexión cerrada.")
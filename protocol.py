@@ -14,10 +14,75 @@ pueden contener \\n. El length-prefix es la solución profesional.
 """
 
 import json
-import struct
+import os
+import socket
 import asyncio
 
+try:
+    import msgspec  # Opcional: encoder/decoder JSON reutilizables, todo en una llamada a C
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson  # Opcional: serializa directo a bytes UTF-8, varias veces más rápido
+except ImportError:
+    orjson = None
+
 HEADER_SIZE = 4  # 4 bytes para longitud del mensaje (hasta ~4 GB)
+MAX_MESSAGE_SIZE = 16 << 20  # Tope de un mensaje JSON (16 MiB): framing roto no aloca GBs
+CHUNK_SIZE = 1 << 18  # 256 KiB por chunk: menos syscalls por MB transferido
+SOCK_BUF_SIZE = 1 << 20  # SO_SNDBUF / SO_RCVBUF por defecto (1 MiB)
+WRITEV_MAX_BUFS = 64  # Buffers por writev (muy por debajo de IOV_MAX)
+
+
+# El formato en el cable es siempre JSON: cliente y servidor pueden usar
+# backends distintos (o ninguno) y siguen entendiéndose
+if msgspec is not None:
+    _dumps = msgspec.json.Encoder().encode
+    _loads = msgspec.json.Decoder().decode
+elif orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(msg: dict) -> bytes:
+        return json.dumps(msg).encode("utf-8")
+    _loads = json.loads
+
+
+def _parse_header(raw_header) -> int:
+    # int.from_bytes está en C y no arma la tupla que devuelve struct.unpack
+    msg_len = int.from_bytes(raw_header, "big")
+    if msg_len > MAX_MESSAGE_SIZE:
+        raise ConnectionError(f"Mensaje demasiado grande ({msg_len} bytes)")
+    return msg_len
+
+
+def _frame_header(payload: bytes) -> bytes:
+    # El tope se respeta también al enviar: el otro lado cortaría la conexión.
+    # ValueError (no ConnectionError): la conexión sigue sana, quien envía
+    # puede mandar un error en su lugar
+    if len(payload) > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Mensaje demasiado grande ({len(payload)} bytes)")
+    return len(payload).to_bytes(HEADER_SIZE, "big")
+
+
+def pack_message(msg: dict) -> bytes:
+    """Arma el frame completo [header][payload]. Útil para respuestas constantes."""
+    payload = _dumps(msg)
+    return _frame_header(payload) + payload
+
+
+def tune_socket(sock, sndbuf: int = SOCK_BUF_SIZE, rcvbuf: int = SOCK_BUF_SIZE):
+    """
+    Desactiva Nagle (los comandos cortos como LIST/DELETE no esperan ~40 ms)
+    y agranda los buffers del kernel para transferencias grandes.
+    Un tamaño 0 deja el valor por defecto del sistema.
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if sndbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
 
 
 # ─────────────────────────────────────────────
@@ -25,63 +90,108 @@ HEADER_SIZE = 4  # 4 bytes para longitud del mensaje (hasta ~4 GB)
 # ─────────────────────────────────────────────
 
 def send_message(sock, msg: dict):
-    payload = json.dumps(msg).encode("utf-8")
-    header = struct.pack("!I", len(payload))
-    sock.sendall(header + payload)
+    # sendmsg = writev: header y payload salen en una sola syscall (y junto con
+    # TCP_NODELAY, en un solo segmento) sin concatenarlos en un bytes nuevo
+    payload = _dumps(msg)
+    header = _frame_header(payload)
+    try:
+        sent = sock.sendmsg((header, payload))
+    except AttributeError:  # Plataformas sin sendmsg (Windows)
+        sock.sendall(header + payload)
+        return
+    if sent < HEADER_SIZE + len(payload):
+        sock.sendall((header + payload)[sent:])
 
 
 def recv_message(sock) -> dict:
-    raw_header = recv_exact(sock, HEADER_SIZE)
-    if not raw_header:
+    # Header y payload se llenan con recv_into y el payload se parsea directo
+    # desde su bytearray: cero copias extra por mensaje
+    header = bytearray(HEADER_SIZE)
+    if not recv_exact_into(sock, header):
         return None
-    msg_len = struct.unpack("!I", raw_header)[0]
-    raw_payload = recv_exact(sock, msg_len)
-    if not raw_payload:
+    msg_len = _parse_header(header)
+    if not msg_len:
+        return None
+    raw_payload = bytearray(msg_len)
+    if not recv_exact_into(sock, raw_payload):
         return None
-    return json.loads(raw_payload.decode("utf-8"))
+    return _loads(raw_payload)
 
 
-def send_file_data(sock, filepath: str, chunk_size: int = 8192):
+def advise_sequential(f):
+    """
+    Avisa al kernel que el archivo se va a leer de punta a punta: agranda el
+    readahead y las lecturas de disco quedan por delante de sendfile.
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def send_file_data(sock, filepath: str):
+    # sendfile(2): el kernel copia del page cache al socket sin pasar por Python.
+    # socket.sendfile cae solo a read+send si la plataforma no lo soporta.
     with open(filepath, "rb") as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            sock.sendall(chunk)
+        advise_sequential(f)
+        sock.sendfile(f)
 
 
-def recv_file_data(sock, size: int, filepath: str, chunk_size: int = 8192,
+def recv_file_data(sock, size: int, filepath: str, chunk_size: int = CHUNK_SIZE,
                    progress_callback=None):
+    # Buffer reutilizado en cada chunk: no se aloca un bytes nuevo por recv
+    buf = bytearray(chunk_size)
+    mv = memoryview(buf)
     received = 0
     with open(filepath, "wb") as f:
         while received < size:
             to_read = min(chunk_size, size - received)
-            chunk = recv_exact(sock, to_read)
-            if not chunk:
+            r = sock.recv_into(mv[:to_read])
+            if not r:
                 raise ConnectionError("Conexión cerrada durante transferencia")
-            f.write(chunk)
-            received += len(chunk)
+            f.write(mv[:r])
+            received += r
             if progress_callback:
                 progress_callback(received, size)
 
 
 def recv_exact(sock, n: int) -> bytes:
-    data = b""
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
-            return None
-        data += chunk
-    return data
+    buf = bytearray(n)
+    if not recv_exact_into(sock, buf):
+        return None
+    return bytes(buf)
+
+
+def recv_exact_into(sock, buf) -> bool:
+    """
+    Llena buf (bytearray/memoryview) completo con recv_into, sin alocar nada.
+    Devuelve False si la conexión se cerró antes de completarlo.
+    """
+    mv = memoryview(buf)
+    n = len(mv)
+    got = 0
+    while got < n:
+        r = sock.recv_into(mv[got:])
+        if not r:
+            return False
+        got += r
+    return True
 
 
 #  Funciones ASYNC (usadas por el servidor)
 
 
 async def async_send_message(writer: asyncio.StreamWriter, msg: dict):
-    payload = json.dumps(msg).encode("utf-8")
-    header = struct.pack("!I", len(payload))
-    writer.write(header + payload)
+    # writelines deja que el transporte junte header + payload sin concatenarlos
+    payload = _dumps(msg)
+    writer.writelines((_frame_header(payload), payload))
+    await writer.drain()
+
+
+async def async_send_frame(writer: asyncio.StreamWriter, frame: bytes):
+    """Envía un frame ya armado con pack_message (sin volver a serializar)."""
+    writer.write(frame)
     await writer.drain()
 
 
@@ -89,33 +199,100 @@ async def async_recv_message(reader: asyncio.StreamReader) -> dict:
     raw_header = await async_recv_exact(reader, HEADER_SIZE)
     if not raw_header:
         return None
-    msg_len = struct.unpack("!I", raw_header)[0]
+    msg_len = _parse_header(raw_header)
     raw_payload = await async_recv_exact(reader, msg_len)
     if not raw_payload:
         return None
-    return json.loads(raw_payload.decode("utf-8"))
+    return _loads(raw_payload)
 
 
 async def async_recv_file_data(reader: asyncio.StreamReader, size: int,
-                               filepath: str, chunk_size: int = 8192):
-    received = 0
+                               filepath: str, chunk_size: int = CHUNK_SIZE):
     with open(filepath, "wb") as f:
-        while received < size:
-            to_read = min(chunk_size, size - received)
-            chunk = await reader.readexactly(to_read)
+        await async_recv_file_into(reader, size, f, chunk_size)
+
+
+async def async_recv_file_into(reader: asyncio.StreamReader, size: int, f,
+                               chunk_size: int = CHUNK_SIZE):
+    """Recibe size bytes crudos y los escribe en un archivo ya abierto."""
+    # read() devuelve lo que ya está en el buffer del StreamReader (hasta
+    # to_read) en vez de esperar a juntar el chunk completo como readexactly:
+    # el buffer interno no crece. Los pedazos (a menudo chicos) se juntan
+    # hasta chunk_size y bajan a disco con un solo writev
+    if not hasattr(os, "writev"):  # Plataformas sin writev (Windows)
+        pending = None
+    else:
+        f.flush()
+        fd = f.fileno()
+        pending, pending_len = [], 0
+    received = 0
+    while received < size:
+        to_read = min(chunk_size, size - received)
+        chunk = await reader.read(to_read)
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", size - received)
+        received += len(chunk)
+        if pending is None:
             f.write(chunk)
-            received += len(chunk)
+            continue
+        pending.append(chunk)
+        pending_len += len(chunk)
+        if pending_len >= chunk_size or len(pending) >= WRITEV_MAX_BUFS or received == size:
+            _writev_all(fd, pending)
+            pending, pending_len = [], 0
+
+
+def _writev_all(fd: int, bufs: list):
+    """os.writev hasta escribir todos los buffers (consume la lista)."""
+    while bufs:
+        written = os.writev(fd, bufs)
+        while bufs and written >= len(bufs[0]):
+            written -= len(bufs.pop(0))
+        if written:
+            bufs[0] = memoryview(bufs[0])[written:]
 
 
 async def async_send_file_data(writer: asyncio.StreamWriter, filepath: str,
-                               chunk_size: int = 8192):
+                               chunk_size: int = CHUNK_SIZE):
     with open(filepath, "rb") as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            writer.write(chunk)
-            await writer.drain()
+        await _async_send_file_chunks(writer, f, None, chunk_size)
+
+
+async def async_send_file_sendfile(writer: asyncio.StreamWriter, f,
+                                   count: int = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Envía un archivo ya abierto con loop.sendfile (zero-copy sobre sockets TCP).
+    Para transportes SSL asyncio hace el fallback por su cuenta; si el loop
+    no implementa sendfile (uvloop, por ejemplo) se copia por chunks, leyendo
+    en el executor por defecto para no frenar el Event Loop.
+    """
+    if count == 0:
+        return  # loop.sendfile rechaza count=0: un archivo vacío no manda nada
+    loop = asyncio.get_running_loop()
+    advise_sequential(f)
+    try:
+        await loop.sendfile(writer.transport, f, count=count)
+    except (NotImplementedError, AttributeError):
+        await _async_send_file_chunks(writer, f, count, chunk_size)
+
+
+async def _async_send_file_chunks(writer: asyncio.StreamWriter, f, count: int,
+                                  chunk_size: int):
+    # Cada read corre en el executor: una lectura con la cache fría no bloquea
+    # a los demás clientes. Es un bytes nuevo por chunk (no un buffer reusado)
+    # porque el transporte puede quedarse con una referencia a lo que se le
+    # pasa a write mientras no lo terminó de mandar
+    loop = asyncio.get_running_loop()
+    remaining = count
+    while remaining is None or remaining > 0:
+        to_read = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = await loop.run_in_executor(None, f.read, to_read)
+        if not chunk:
+            break
+        writer.write(chunk)
+        await writer.drain()
+        if remaining is not None:
+            remaining -= len(chunk)
 
 
 async def async_recv_exact(reader: asyncio.StreamReader, n: int) -> bytes:
@@ -8,14 +8,21 @@ import multiprocessing
 import os
 import signal
 import sys
-import uuid
+import time
 import logging
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
 
-from protocol import async_send_message, async_recv_message
-from workers.reader import reader_worker
-from workers.writer import writer_worker
+try:
+    import uvloop  # Opcional: Event Loop sobre libuv, más rápido para sockets
+except ImportError:
+    uvloop = None
+
+from protocol import (async_send_message, async_send_frame, async_recv_message,
+                      async_recv_file_into, async_send_file_sendfile, pack_message,
+                      tune_socket, SOCK_BUF_SIZE)
+from workers import STAGING_DIR, Request
+from workers.reader import process_read
+from workers.writer import process_write, open_upload_file, discard_upload_file
 from workers.logger import logger_worker
 
 # ─────────────────────────────────────────────
@@ -26,73 +33,110 @@ DEFAULT_PORT = 65432
 DEFAULT_FOLDER = "."
 DEFAULT_DB = "logs.db"
 
+# Respuestas constantes serializadas una sola vez
+READY_FRAME = pack_message({"status": "ready", "action": "UPLOAD"})
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
     datefmt='%H:%M:%S'
 )
 
-# Colas IPC
-read_request_q = multiprocessing.Queue()
-read_response_q = multiprocessing.Queue()
-write_request_q = multiprocessing.Queue()
-write_response_q = multiprocessing.Queue()
-log_q = multiprocessing.Queue()
+# Cola IPC hacia el Logger (sigue siendo un proceso: aísla el I/O de SQLite).
+# Se crea en main, después de elegir el start method de multiprocessing.
+log_q = None
 
 # Referencias a workers hijos
 workers_procs = []
 
+# Pools de hilos para las operaciones de disco: corren en este mismo proceso,
+# sin pickle ni colas. Las lecturas van en paralelo; las escrituras usan un
+# único hilo para seguir siendo secuenciales (ver workers/writer.py).
+READ_POOL_SIZE = 8
+read_pool = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="FS-Reader")
+write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FS-Writer")
+
+LIST_CACHE_TTL = 1.5  # Segundos que un listado cacheado se considera vigente
+
+
+class ClientSession:
+    """
+    Estado de un cliente conectado. Guarda una cache corta de listados (la raíz
+    y el último directorio pedido) para los ciclos ls -> cp -> rm típicos:
+    repetir un LIST dentro del TTL no vuelve a recorrer el disco.
+    """
+
+    def __init__(self, name: str, ip: str, port: int):
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.list_cache: dict[str, tuple[float, dict]] = {}
+
+    @staticmethod
+    def _list_key(path: str) -> str:
+        return "" if path in ("/", "", ".") else path.strip("/")
+
+    def cached_list(self, path: str):
+        entry = self.list_cache.get(self._list_key(path))
+        if entry and time.monotonic() - entry[0] < LIST_CACHE_TTL:
+            return entry[1]
+        return None
+
+    def store_list(self, path: str, result: dict):
+        key = self._list_key(path)
+        # Sólo se conservan la raíz y el directorio más reciente
+        self.list_cache = {k: v for k, v in self.list_cache.items() if k == ""}
+        self.list_cache[key] = (time.monotonic(), result)
+
+
+# Se incrementa en cada escritura: un LIST que empezó antes de una escritura
+# no se cachea aunque termine después (ver handle_client)
+list_generation = 0
+
+
+def invalidate_list_caches():
+    """Una escritura (UPLOAD/DELETE/CUT) deja viejo cualquier listado cacheado."""
+    global list_generation
+    list_generation += 1
+    for session in clients.values():
+        session.list_cache.clear()
+
+
 # Estado asíncrono
-pending_requests: dict[str, asyncio.Future] = {}
-clients: dict[str, dict] = {}
-executor = ThreadPoolExecutor(max_workers=2)
+clients: dict[str, ClientSession] = {}
 
 # Configuración del host (seteada en main)
 shared_folder_path = ""
 db_path_file = ""
+tcp_sndbuf = SOCK_BUF_SIZE
+tcp_rcvbuf = SOCK_BUF_SIZE
 
 
 #  Manejo de Workers
 
 def start_workers():
     global workers_procs
-    
-    r_proc = multiprocessing.Process(
-        target=reader_worker,
-        args=(read_request_q, read_response_q, shared_folder_path),
-        daemon=True,
-        name="Worker-Reader"
-    )
-    w_proc = multiprocessing.Process(
-        target=writer_worker,
-        args=(write_request_q, write_response_q, shared_folder_path),
-        daemon=True,
-        name="Worker-Writer"
-    )
+
     l_proc = multiprocessing.Process(
         target=logger_worker,
         args=(log_q, db_path_file),
         daemon=True,
         name="Worker-Logger"
     )
-
-    r_proc.start()
-    w_proc.start()
     l_proc.start()
 
-    workers_procs.extend([r_proc, w_proc, l_proc])
+    workers_procs.append(l_proc)
 
     logging.info("Workers iniciados:")
-    logging.info(f"  Reader PID: {r_proc.pid}")
-    logging.info(f"  Writer PID: {w_proc.pid}")
+    logging.info(f"  Lectura: pool de {READ_POOL_SIZE} hilos")
+    logging.info("  Escritura: 1 hilo (secuencial)")
     logging.info(f"  Logger PID: {l_proc.pid}")
 
 
 def stop_workers():
     logging.info("Deteniendo Workers...")
     try:
-        read_request_q.put(None)
-        write_request_q.put(None)
+        _flush_logs()
         log_q.put(None)
     except Exception:
         pass
@@ -103,68 +147,83 @@ def stop_workers():
             if proc.is_alive():
                 proc.terminate()
 
-    executor.shutdown(wait=False)
+    read_pool.shutdown(wait=False)
+    write_pool.shutdown(wait=True)
     logging.info("Todos los Workers detenidos.")
 
 
 #  Comunicación con Workers
 
-async def send_to_worker(queue_req, queue_resp, request: dict) -> dict:
-    req_id = str(uuid.uuid4())
-    request["id"] = req_id
+async def run_worker_task(pool: ThreadPoolExecutor, task, request: Request) -> dict:
+    """Ejecuta una operación de disco en el pool indicado sin bloquear el Event Loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, task, shared_folder_path, request)
 
-    loop = asyncio.get_event_loop()
-    future = loop.create_future()
-    pending_requests[req_id] = (future, queue_resp)
 
-    await loop.run_in_executor(executor, queue_req.put, request)
+_ts_cache = [0, ""]  # [segundo, "YYYY-MM-DDTHH:MM:SS"] del último timestamp armado
 
-    result = await future
-    del pending_requests[req_id]
-    return result
 
+def _timestamp() -> str:
+    """
+    Timestamp ISO local con microsegundos. La parte de fecha/hora se formatea
+    una vez por segundo; el resto de las llamadas sólo agrega la fracción.
+    """
+    t = time.time()
+    sec = int(t)
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+    return f"{_ts_cache[1]}.{int((t - sec) * 1e6):06d}"
 
-def _try_get(q):
-    try:
-        return q.get_nowait()
-    except Exception:
-        return None
 
+# Eventos generados en la vuelta actual del Event Loop, todavía sin encolar
+_log_pending: list[tuple] = []
 
-async def poll_response_queues():
-    loop = asyncio.get_event_loop()
-    while True:
-        for resp_q in (read_response_q, write_response_q):
-            try:
-                result = await asyncio.wait_for(
-                    loop.run_in_executor(executor, _try_get, resp_q),
-                    timeout=0.05
-                )
-                if result is not None:
-                    req_id = result.get("id")
-                    if req_id in pending_requests:
-                        future, _ = pending_requests[req_id]
-                        if not future.done():
-                            future.set_result(result)
-            except (asyncio.TimeoutError, Exception):
-                pass
-        
-        await asyncio.sleep(0.01)
+
+def _flush_logs():
+    """Manda al Logger todos los eventos pendientes en un solo put (un pickle)."""
+    global _log_pending
+    if _log_pending:
+        batch, _log_pending = _log_pending, []
+        log_q.put(batch)
 
 
 def log_event(client_name: str, client_ip: str, client_port: int,
               action: str, path: str = "", status: str = "ok", detail: str = ""):
-    """Encola evento para el Worker de Logger."""
-    log_q.put({
-        "timestamp": datetime.now().isoformat(),
-        "client_name": client_name,
-        "client_ip": client_ip,
-        "client_port": client_port,
-        "action": action,
-        "path": path,
-        "status": status,
-        "detail": detail,
-    })
+    """
+    Registra un evento para el Worker de Logger (tupla con el orden de las
+    columnas). Los eventos de una misma vuelta del Event Loop se juntan y
+    cruzan la Queue como una sola lista.
+    """
+    if not _log_pending:
+        asyncio.get_running_loop().call_soon(_flush_logs)
+    _log_pending.append((_timestamp(), client_name, client_ip, client_port,
+                         action, path, status, detail))
+
+
+async def send_file_response(writer: asyncio.StreamWriter, action: str, result: dict) -> str:
+    """
+    Envía la cabecera y el contenido de un archivo que un Worker dejó abierto
+    (DOWNLOAD/CUT) directo desde disco con sendfile. Devuelve el status final.
+    El archivo se cierra siempre al terminar.
+    """
+    if result["status"] != "ok":
+        await async_send_message(writer, {
+            "status": "error", "action": action,
+            "message": result.get("message", "Error desc"),
+        })
+        return result["status"]
+
+    with result["file"] as f:
+        size = result["size"]  # fstat del Worker sobre este mismo descriptor
+        await async_send_message(writer, {
+            "status": "ok",
+            "action": action,
+            "path": result["path"],
+            "size": size,
+        })
+        await async_send_file_sendfile(writer, f, size)
+    return "ok"
 
 
 #  Manejo de Cliente Individual (Protocolo)
@@ -174,8 +233,15 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
     client_ip, client_port = addr[0], addr[1]
     client_id = f"{client_ip}:{client_port}"
 
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        tune_socket(sock, tcp_sndbuf, tcp_rcvbuf)
+
     # Handshake
-    msg = await async_recv_message(reader)
+    try:
+        msg = await async_recv_message(reader)
+    except ConnectionError:
+        msg = None
     if not msg or "name" not in msg:
         writer.close()
         try:
@@ -185,7 +251,8 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
         return
 
     client_name = msg["name"]
-    clients[client_id] = {"name": client_name, "ip": client_ip, "port": client_port}
+    session = ClientSession(client_name, client_ip, client_port)
+    clients[client_id] = session
 
     logging.info(f"[+] Cliente conectado: {client_name} ({client_id})")
     log_event(client_name, client_ip, client_port, "CONNECT",
@@ -208,50 +275,74 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
             logging.info(f"[{client_name}] -> {action} {path}")
 
             if action == "LIST":
-                result = await send_to_worker(
-                    read_request_q, read_response_q,
-                    {"action": "LIST", "path": path}
-                )
-                await async_send_message(writer, {
-                    "status": result["status"],
-                    "action": "LIST",
-                    "entries": result.get("entries", []),
-                    "message": result.get("message", ""),
-                })
-                log_event(client_name, client_ip, client_port, "LIST", path, result["status"])
-
-            elif action == "DOWNLOAD":
-                result = await send_to_worker(
-                    read_request_q, read_response_q,
-                    {"action": "DOWNLOAD", "path": path}
-                )
-                if result["status"] == "ok":
+                result = session.cached_list(path)
+                if result is None:
+                    generation = list_generation
+                    result = await run_worker_task(
+                        read_pool, process_read,
+                        Request("LIST", path)
+                    )
+                    if result["status"] == "ok" and generation == list_generation:
+                        session.store_list(path, result)
+                status = result["status"]
+                try:
                     await async_send_message(writer, {
-                        "status": "ok",
-                        "action": "DOWNLOAD",
-                        "path": result["path"],
-                        "size": result["size"],
+                        "status": status,
+                        "action": "LIST",
+                        "names": result.get("names", []),
+                        "sizes": result.get("sizes", []),
+                        "is_dir": result.get("is_dir", []),
+                        "message": result.get("message", ""),
                     })
-                    writer.write(result["data"])
-                    await writer.drain()
-                else:
+                except ValueError as e:  # El listado supera MAX_MESSAGE_SIZE
+                    status = "error"
                     await async_send_message(writer, {
-                        "status": "error", "action": "DOWNLOAD",
-                        "message": result.get("message", "Error desc"),
+                        "status": "error",
+                        "action": "LIST",
+                        "names": [], "sizes": [], "is_dir": [],
+                        "message": f"Listado demasiado grande: {e}",
                     })
-                log_event(client_name, client_ip, client_port, "DOWNLOAD", path, result["status"])
+                log_event(client_name, client_ip, client_port, "LIST", path, status)
+
+            elif action == "DOWNLOAD":
+                result = await run_worker_task(
+                    read_pool, process_read,
+                    Request("DOWNLOAD", path)
+                )
+                status = await send_file_response(writer, "DOWNLOAD", result)
+                log_event(client_name, client_ip, client_port, "DOWNLOAD", path, status)
 
             elif action == "UPLOAD":
                 file_size = msg.get("size", 0)
-                await async_send_message(writer, {"status": "ready", "action": "UPLOAD"})
-                
-                # Leemos bytes crudos
-                file_data = await reader.readexactly(file_size)
-                
-                result = await send_to_worker(
-                    write_request_q, write_response_q,
-                    {"action": "UPLOAD", "path": path, "data": file_data}
+
+                # Los bytes crudos van directo a un temporal en disco (RAM O(chunk));
+                # al Writer sólo le llega el archivo para moverlo a su destino.
+                # Se abre (en el pool del Writer, fuera del Event Loop) antes del
+                # READY: si falla, el cliente recibe el error en vez de mandar el
+                # archivo a una conexión que se cae
+                try:
+                    upload_file, tmp_path = await asyncio.get_running_loop().run_in_executor(
+                        write_pool, open_upload_file, shared_folder_path)
+                except OSError as e:
+                    await async_send_message(writer, {
+                        "status": "error", "action": "UPLOAD", "message": str(e),
+                    })
+                    log_event(client_name, client_ip, client_port, "UPLOAD", path, "error", str(e))
+                    continue
+
+                try:
+                    await async_send_frame(writer, READY_FRAME)
+                    await async_recv_file_into(reader, file_size, upload_file)
+                except BaseException:
+                    discard_upload_file(upload_file, tmp_path)
+                    raise
+
+                result = await run_worker_task(
+                    write_pool, process_write,
+                    Request("UPLOAD", path, upload_file, tmp_path)
                 )
+                if result["status"] == "ok":
+                    invalidate_list_caches()
                 await async_send_message(writer, {
                     "status": result["status"],
                     "action": "UPLOAD",
@@ -260,10 +351,12 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
                 log_event(client_name, client_ip, client_port, "UPLOAD", path, result["status"], f"{file_size}b")
 
             elif action == "DELETE":
-                result = await send_to_worker(
-                    write_request_q, write_response_q,
-                    {"action": "DELETE", "path": path}
+                result = await run_worker_task(
+                    write_pool, process_write,
+                    Request("DELETE", path)
                 )
+                if result["status"] == "ok":
+                    invalidate_list_caches()
                 await async_send_message(writer, {
                     "status": result["status"],
                     "action": "DELETE",
@@ -272,25 +365,14 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
                 log_event(client_name, client_ip, client_port, "DELETE", path, result["status"])
 
             elif action == "CUT":
-                result = await send_to_worker(
-                    write_request_q, write_response_q,
-                    {"action": "CUT", "path": path}
+                result = await run_worker_task(
+                    write_pool, process_write,
+                    Request("CUT", path)
                 )
                 if result["status"] == "ok":
-                    await async_send_message(writer, {
-                        "status": "ok",
-                        "action": "CUT",
-                        "path": result["path"],
-                        "size": result["size"],
-                    })
-                    writer.write(result["data"])
-                    await writer.drain()
-                else:
-                    await async_send_message(writer, {
-                        "status": "error", "action": "CUT",
-                        "message": result.get("message", "Error desc"),
-                    })
-                log_event(client_name, client_ip, client_port, "CUT", path, result["status"])
+                    invalidate_list_caches()
+                status = await send_file_response(writer, "CUT", result)
+                log_event(client_name, client_ip, client_port, "CUT", path, status)
 
             else:
                 await async_send_message(writer, {"status": "error", "message": f"Desconocido: {action}"})
@@ -313,10 +395,9 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
             pass
 
 async def async_main(host: str, port: int):
-    os.makedirs(shared_folder_path, exist_ok=True)
-    
+    os.makedirs(os.path.join(shared_folder_path, STAGING_DIR), exist_ok=True)
+
     start_workers()
-    poll_task = asyncio.create_task(poll_response_queues())
     
     server = await asyncio.start_server(handle_client, host, port)
     
@@ -334,28 +415,36 @@ async def async_main(host: str, port: int):
     except asyncio.CancelledError:
         pass
     finally:
-        poll_task.cancel()
         stop_workers()
 
 
 
 def main():
-    global shared_folder_path, db_path_file
+    global shared_folder_path, db_path_file, tcp_sndbuf, tcp_rcvbuf, log_q
     
     parser = argparse.ArgumentParser(description="Clisend Server Funcional")
     parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
     parser.add_argument("-f", "--folder", type=str, default=DEFAULT_FOLDER)
     parser.add_argument("--host", type=str, default=None)
     parser.add_argument("--db", type=str, default=DEFAULT_DB)
+    parser.add_argument("--tcp-sndbuf", type=int, default=SOCK_BUF_SIZE,
+                        help="SO_SNDBUF de cada conexión en bytes (0 = default del SO)")
+    parser.add_argument("--tcp-rcvbuf", type=int, default=SOCK_BUF_SIZE,
+                        help="SO_RCVBUF de cada conexión en bytes (0 = default del SO)")
     args = parser.parse_args()
 
-    shared_folder_path = os.path.abspath(args.folder)
+    # Se resuelve una sola vez: los Workers comparan contra esta ruta ya real
+    shared_folder_path = os.path.realpath(args.folder)
     db_path_file = os.path.abspath(args.db)
+    tcp_sndbuf = args.tcp_sndbuf
+    tcp_rcvbuf = args.tcp_rcvbuf
 
-    multiprocessing.set_start_method('fork', force=True)
-
-    # El SO limpia los hijos zombies
-    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # forkserver: los hijos salen de un proceso plantilla chico (con el módulo
+    # del Logger ya importado), no de una copia del servidor con su Event Loop.
+    # El forkserver también se encarga de cosechar a los hijos.
+    multiprocessing.set_start_method('forkserver', force=True)
+    multiprocessing.set_forkserver_preload(['workers.logger'])
+    log_q = multiprocessing.Queue()
 
     # Manejo de apagado
     def shutdown_handler(sig, frame):
@@ -366,6 +455,10 @@ def main():
     signal.signal(signal.SIGINT, shutdown_handler)
     signal.signal(signal.SIGTERM, shutdown_handler)
 
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logging.info("Usando uvloop como Event Loop.")
+
     try:
         asyncio.run(async_main(args.host, args.port))
     except KeyboardInterrupt:
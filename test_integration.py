@@ -3,6 +3,7 @@ import socket
 import sys
 sys.path.insert(0, ".")
 from protocol import send_message, recv_message
+from workers import STAGING_DIR, is_inside
 
 
 def main():
@@ -21,7 +22,7 @@ def main():
     send_message(s, {"action": "LIST", "path": "/"})
     resp = recv_message(s)
     assert resp["status"] == "ok", f"Error en LIST: {resp}"
-    names = [e["name"] for e in resp.get("entries", [])]
+    names = resp.get("names", [])
     print(f"3. ✅ LIST: {names}")
 
     # UPLOAD
@@ -37,7 +38,7 @@ def main():
     # LIST de nuevo (debería incluir test_auto.txt)
     send_message(s, {"action": "LIST", "path": "/"})
     resp = recv_message(s)
-    names = [e["name"] for e in resp.get("entries", [])]
+    names = resp.get("names", [])
     assert "test_auto.txt" in names, f"test_auto.txt no aparece en: {names}"
     print(f"5. ✅ LIST post-upload: {names}")
 
@@ -61,10 +62,54 @@ def main():
     # LIST final (no debería tener test_auto.txt)
     send_message(s, {"action": "LIST", "path": "/"})
     resp = recv_message(s)
-    names = [e["name"] for e in resp.get("entries", [])]
+    names = resp.get("names", [])
     assert "test_auto.txt" not in names, f"test_auto.txt sigue presente: {names}"
     print(f"8. ✅ LIST post-delete: {names}")
 
+    # Archivo vacío: UPLOAD + DOWNLOAD + CUT de 0 bytes no cortan la conexión
+    send_message(s, {"action": "UPLOAD", "path": "test_empty.txt", "size": 0})
+    resp = recv_message(s)
+    assert resp.get("status") == "ready", f"Error en UPLOAD vacío ready: {resp}"
+    resp = recv_message(s)
+    assert resp["status"] == "ok", f"Error en UPLOAD vacío: {resp}"
+    send_message(s, {"action": "DOWNLOAD", "path": "test_empty.txt"})
+    resp = recv_message(s)
+    assert resp["status"] == "ok" and resp["size"] == 0, f"Error en DOWNLOAD vacío: {resp}"
+    send_message(s, {"action": "CUT", "path": "test_empty.txt"})
+    resp = recv_message(s)
+    assert resp["status"] == "ok" and resp["size"] == 0, f"Error en CUT vacío: {resp}"
+    send_message(s, {"action": "LIST", "path": "/"})
+    resp = recv_message(s)
+    names = resp.get("names", [])
+    assert "test_empty.txt" not in names, f"test_empty.txt sigue presente: {names}"
+    print("9. ✅ Archivo vacío: UPLOAD, DOWNLOAD y CUT")
+
+    # Path traversal: nada fuera de la carpeta compartida
+    for path in ("../x", "a/../../x", "/../x"):
+        send_message(s, {"action": "DOWNLOAD", "path": path})
+        resp = recv_message(s)
+        assert resp.get("message") == "Ruta no permitida", f"DOWNLOAD {path} no rechazado: {resp}"
+    print("10. ✅ Path traversal rechazado")
+
+    # La carpeta de staging es interna del servidor
+    for action, path in (("DELETE", STAGING_DIR), ("LIST", STAGING_DIR),
+                         ("DOWNLOAD", f"{STAGING_DIR}/x"), ("CUT", f"a/../{STAGING_DIR}/x")):
+        send_message(s, {"action": action, "path": path})
+        resp = recv_message(s)
+        assert resp.get("message") == "Ruta no permitida", f"{action} {path} no rechazado: {resp}"
+    for path in ("/", "./", ".", "a/.."):
+        send_message(s, {"action": "LIST", "path": path})
+        resp = recv_message(s)
+        names = resp.get("names", [])
+        assert STAGING_DIR not in names, f"LIST {path} muestra {STAGING_DIR}: {names}"
+    print(f"11. ✅ {STAGING_DIR} inaccesible y oculto")
+
+    # Prefijos: /share no debe aceptar /shared_evil
+    assert is_inside("/srv/share/a", "/srv/share")
+    assert not is_inside("/srv/shared_evil/a", "/srv/share")
+    assert not is_inside("/srv/share_evil", "/srv/share")
+    print("12. ✅ Chequeo de prefijo de carpeta")
+
     s.close()
     print("\n=== ✅ Todos los tests pasaron! ===")
 
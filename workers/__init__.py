@@ -0,0 +1,67 @@
+import os
+import stat
+from dataclasses import dataclass
+
+# Subcarpeta oculta (dentro de la compartida) donde el Writer deja los archivos
+# en tránsito. Vive en el mismo filesystem, así los rename son atómicos.
+STAGING_DIR = ".clisend-tmp"
+
+
+@dataclass(slots=True)
+class Request:
+    """
+    Petición del servidor a un Worker. Con __slots__ cada instancia es un
+    objeto chico de campos fijos, sin el dict de claves que se armaba antes.
+    file/tmp_path sólo los usa UPLOAD (ver writer.open_upload_file).
+    """
+    action: str
+    path: str
+    file: object = None
+    tmp_path: str = None
+
+
+def is_inside(real_path: str, shared_real: str) -> bool:
+    """
+    True si real_path (ya resuelto con realpath) está dentro de shared_real.
+    Compara contra "carpeta + separador", así /share no acepta /shared_evil.
+    """
+    return real_path == shared_real or real_path.startswith(shared_real.rstrip(os.sep) + os.sep)
+
+
+def resolve_safe(shared_folder: str, rel_path: str):
+    """
+    Arma la ruta absoluta de rel_path (ya sin "/" inicial) dentro de
+    shared_folder (ya resuelto con realpath). Devuelve None si, resuelta,
+    cae fuera de la carpeta (path traversal: ../../etc/passwd, symlinks)
+    o dentro de STAGING_DIR, que es interna del servidor.
+    """
+    target = os.path.normpath(os.path.join(shared_folder, rel_path))
+    real_target = os.path.realpath(target)
+    if not is_inside(real_target, shared_folder):
+        return None
+    staging = os.path.join(shared_folder, STAGING_DIR)
+    if is_inside(target, staging) or is_inside(real_target, staging):
+        return None
+    return target
+
+
+def open_regular_file(path: str):
+    """
+    Abre path para lectura y devuelve (file, tamaño) con un único fstat sobre
+    el descriptor ya abierto. Devuelve None si no existe o no es un archivo
+    regular. O_NONBLOCK evita quedar bloqueado al abrir un FIFO; en archivos
+    regulares no cambia nada. PermissionError se propaga.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_BINARY", 0))
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+    try:
+        st = os.fstat(fd)
+    except BaseException:
+        os.close(fd)
+        raise
+    if not stat.S_ISREG(st.st_mode):
+        os.close(fd)
+        return None
+    return os.fdopen(fd, "rb"), st.st_size
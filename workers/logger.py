@@ -1,17 +1,43 @@
 """
 Recibe eventos por una multiprocessing.Queue y los registra en SQLite.
+Cada elemento de la Queue es una lista de eventos (tuplas) ya agrupados por el servidor.
 """
 
 import sqlite3
 import os
+import queue
 import signal
+import time
 import logging
-from datetime import datetime
 from multiprocessing import Queue
 
+MAX_BATCH = 256  # Máximo de eventos por transacción
+FLUSH_INTERVAL = 0.05  # Segundos máximos que un evento espera a que se junte su lote
+MMAP_SIZE = 256 << 20  # Bytes del archivo de la base que SQLite lee por mmap
+CACHE_SIZE_KIB = 64 << 10  # Cache de páginas de SQLite en KiB (64 MiB)
+INSERT_ATTEMPTS = 3  # Intentos por lote ante un OperationalError (lock ocupado, I/O)
+
+# Mismo texto SQL siempre: sqlite3 reutiliza el statement ya preparado de su cache
+INSERT_SQL = """
+    INSERT INTO logs (timestamp, client_name, client_ip, client_port,
+                      action, path, status, detail)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 
 def _init_db(db_path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+    # isolation_level=None: sqlite3 no abre ni cierra transacciones por su
+    # cuenta; cada lote lo delimita _insert_logs con BEGIN IMMEDIATE/COMMIT
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # WAL + synchronous=NORMAL: un commit ya no fuerza fsync del archivo principal
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Páginas leídas por mmap (sin pread) y 64 MiB de cache de páginas propia
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    conn.execute("PRAGMA busy_timeout=5000")
     conn.execute("""
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,51 +51,79 @@ def _init_db(db_path: str) -> sqlite3.Connection:
             detail TEXT DEFAULT ''
         )
     """)
-    conn.commit()
     return conn
 
 
-def _insert_log(conn: sqlite3.Connection, event: dict):
-    """Inserta un registro de log en la base de datos."""
-    conn.execute("""
-        INSERT INTO logs (timestamp, client_name, client_ip, client_port,
-                          action, path, status, detail)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        event.get("timestamp", datetime.now().isoformat()),
-        event.get("client_name", "unknown"),
-        event.get("client_ip", "0.0.0.0"),
-        event.get("client_port", 0),
-        event.get("action", "UNKNOWN"),
-        event.get("path", ""),
-        event.get("status", "ok"),
-        event.get("detail", ""),
-    ))
-    conn.commit()
+def _insert_logs(conn: sqlite3.Connection, events: list):
+    """
+    Inserta un lote de eventos en una sola transacción (un único commit/fsync).
+    Cada evento es una tupla con el orden de las columnas de la tabla.
+    BEGIN IMMEDIATE toma el lock de escritura una vez por lote (si está
+    ocupado, busy_timeout espera). Si igual falla con OperationalError
+    (lock, I/O) el lote se reintenta hasta INSERT_ATTEMPTS veces.
+    """
+    for attempt in range(1, INSERT_ATTEMPTS + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(INSERT_SQL, events)
+            conn.execute("COMMIT")
+            return
+        except sqlite3.OperationalError:
+            _rollback(conn)
+            if attempt == INSERT_ATTEMPTS:
+                raise
+        except BaseException:
+            _rollback(conn)
+            raise
+
+
+def _rollback(conn: sqlite3.Connection):
+    # Si el COMMIT falló la transacción sigue abierta: sin este ROLLBACK
+    # todos los BEGIN siguientes fallarían ("transaction within a transaction")
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
 
 
 def logger_worker(log_queue: Queue, db_path: str = "logs.db"):
     """
     Proceso principal del Worker de Logging.
-    Lee de log_queue indefinidamente y guarda en SQLite.
+    Lee de log_queue indefinidamente y guarda en SQLite. Tras cada lista de
+    eventos sigue juntando durante FLUSH_INTERVAL (hasta MAX_BATCH) y lo
+    inserta junto.
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
 
     conn = _init_db(db_path)
     logging.info(f"[LOGGER] Iniciado. Base de datos: {os.path.abspath(db_path)}")
 
+    running = True
     try:
-        while True:
-            event = log_queue.get()  # Bloqueante: espera un evento sin gastar CPU
+        while running:
+            events = log_queue.get()  # Bloqueante: espera eventos sin gastar CPU
 
-            if event is None:
+            if events is None:
                 break
 
+            batch = list(events)
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        events = log_queue.get(timeout=remaining)
+                    else:
+                        events = log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if events is None:
+                    running = False
+                    break
+                batch.extend(events)
+
             try:
-                _insert_log(conn, event)
-                action = event.get("action", "?")
-                name = event.get("client_name", "?")
-                logging.info(f"[DB] {name} -> {action}")
+                _insert_logs(conn, batch)
+                for ev in batch:
+                    logging.info(f"[DB] {ev[1]} -> {ev[4]}")
             except Exception as e:
                 logging.error(f"[LOGGER] Error al guardar log: {e}")
 
@@ -1,68 +1,78 @@
 """
-workers/reader.py — Worker de Lectura (Proceso independiente)
+workers/reader.py — Worker de Lectura (Pool de hilos)
 
 Maneja operaciones de solo lectura sobre la carpeta compartida:
   - LIST: listar archivos y directorios
-  - DOWNLOAD: leer un archivo y devolver su contenido
+  - DOWNLOAD: validar un archivo y devolverlo abierto para que el servidor lo envíe
 
-Corre como proceso separado para no bloquear el Event Loop del servidor.
+Corre en un pool de hilos del servidor para no bloquear el Event Loop.
 Las lecturas son seguras para concurrencia (múltiples lecturas simultáneas no causan problemas).
 """
 
 import os
-import signal
-import logging
-from multiprocessing import Queue
+import stat
+from operator import attrgetter
 
+from workers import STAGING_DIR, Request, open_regular_file, resolve_safe
 
-def _list_files(shared_folder: str, rel_path: str) -> dict:
+
+def _list_files(shared_folder: str, request: Request) -> dict:
     """Lista archivos y carpetas en una ruta relativa dentro de la carpeta compartida."""
+    rel_path = request.path
     if rel_path in ("/", "", "."):
         rel_path = ""
     rel_path = rel_path.lstrip("/")
-    target = os.path.normpath(os.path.join(shared_folder, rel_path))
-
-    # Protección contra path traversal (../../etc/passwd)
-    if not os.path.realpath(target).startswith(os.path.realpath(shared_folder)):
+    target = resolve_safe(shared_folder, rel_path)
+    if target is None:
         return {"status": "error", "message": "Ruta no permitida"}
 
-    if not os.path.isdir(target):
+    try:
+        target_is_dir = stat.S_ISDIR(os.stat(target).st_mode)
+    except OSError:
+        target_is_dir = False
+    if not target_is_dir:
         return {"status": "error", "message": f"Directorio no encontrado: {rel_path or '/'}"}
 
-    entries = []
-    for name in sorted(os.listdir(target)):
-        full = os.path.join(target, name)
-        entry = {
-            "name": name,
-            "is_dir": os.path.isdir(full),
-            "size": os.path.getsize(full) if os.path.isfile(full) else 0,
-        }
-        entries.append(entry)
+    # scandir trae el tipo de cada entrada sin un stat extra. El resultado va
+    # en tres listas paralelas (struct-of-arrays) en vez de un dict por entrada
+    with os.scandir(target) as it:
+        dir_entries = sorted(it, key=attrgetter("name"))
 
-    return {"status": "ok", "entries": entries}
+    names, sizes, is_dir = [], [], []
+    for e in dir_entries:
+        if target == shared_folder and e.name == STAGING_DIR:
+            continue
+        entry_is_dir = e.is_dir()
+        names.append(e.name)
+        is_dir.append(entry_is_dir)
+        # Sólo los archivos regulares necesitan stat (para el tamaño)
+        sizes.append(0 if entry_is_dir or not e.is_file() else e.stat().st_size)
 
+    return {"status": "ok", "names": names, "sizes": sizes, "is_dir": is_dir}
 
-def _read_file(shared_folder: str, rel_path: str) -> dict:
-    """Lee un archivo y devuelve su contenido como bytes."""
-    rel_path = rel_path.lstrip("/")
-    target = os.path.normpath(os.path.join(shared_folder, rel_path))
 
-    # Protección contra path traversal
-    if not os.path.realpath(target).startswith(os.path.realpath(shared_folder)):
+def _read_file(shared_folder: str, request: Request) -> dict:
+    """
+    Valida un archivo y lo devuelve ya abierto (con su tamaño). El contenido
+    no se lee acá: el servidor lo manda del descriptor al socket con sendfile,
+    y el open no corre en el Event Loop.
+    """
+    rel_path = request.path.lstrip("/")
+    target = resolve_safe(shared_folder, rel_path)
+    if target is None:
         return {"status": "error", "message": "Ruta no permitida"}
 
-    if not os.path.isfile(target):
-        return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
-
     try:
-        size = os.path.getsize(target)
-        with open(target, "rb") as f:
-            data = f.read()
+        # Tipo y tamaño salen de un solo fstat sobre el archivo ya abierto
+        opened = open_regular_file(target)
+        if opened is None:
+            return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
+        f, size = opened
         return {
             "status": "ok",
             "size": size,
-            "data": data,
             "path": rel_path,
+            "file": f,
         }
     except PermissionError:
         return {"status": "error", "message": f"Permiso denegado: {rel_path}"}
@@ -70,42 +80,31 @@ def _read_file(shared_folder: str, rel_path: str) -> dict:
         return {"status": "error", "message": str(e)}
 
 
-def reader_worker(request_queue: Queue, response_queue: Queue, shared_folder: str):
+# Acción -> handler(shared_folder, request): una búsqueda en dict en vez de
+# una cascada de if/elif
+READ_DISPATCH = {
+    "LIST": _list_files,
+    "DOWNLOAD": _read_file,
+}
+
+
+def process_read(shared_folder: str, request: Request) -> dict:
     """
-    Proceso principal del Worker de Lectura.
-    Lee peticiones de request_queue, las procesa, y pone resultados en response_queue.
-    Se detiene al recibir None.
+    Procesa una petición de lectura y devuelve el resultado.
+    Corre en un hilo del pool de lectura del servidor; varias pueden
+    ejecutarse a la vez. shared_folder llega ya resuelto con realpath y
+    request.action en mayúsculas (lo normaliza el servidor).
     """
-    # Ignorar SIGINT para que solo el padre maneje Ctrl+C (evita zombies)
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
-
-    shared_folder = os.path.abspath(shared_folder)
-    logging.info(f"[READER] Iniciado. Carpeta: {shared_folder}")
+    action = request.action
+    handler = READ_DISPATCH.get(action)
 
     try:
-        while True:
-            request = request_queue.get()
-
-            if request is None:
-                break
-
-            req_id = request.get("id")
-            action = request.get("action", "").upper()
-            path = request.get("path", "/")
-
-            try:
-                if action == "LIST":
-                    result = _list_files(shared_folder, path)
-                elif action == "DOWNLOAD":
-                    result = _read_file(shared_folder, path)
-                else:
-                    result = {"status": "error", "message": f"Acción desconocida: {action}"}
-            except Exception as e:
-                result = {"status": "error", "message": f"Error interno: {e}"}
-
-            result["id"] = req_id
-            result["action"] = action
-            response_queue.put(result)
-
-    finally:
-        logging.info("[READER] Detenido.")
+        if handler is None:
+            result = {"status": "error", "message": f"Acción desconocida: {action}"}
+        else:
+            result = handler(shared_folder, request)
+    except Exception as e:
+        result = {"status": "error", "message": f"Error interno: {e}"}
+
+    result["action"] = action
+    return result
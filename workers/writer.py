@@ -1,102 +1,168 @@
 """
-workers/writer.py — Worker de Escritura (Proceso independiente)
+workers/writer.py — Worker de Escritura (Hilo dedicado)
 
 Maneja operaciones que modifican la carpeta compartida:
-  - UPLOAD: guardar un archivo recibido del cliente
+  - UPLOAD: mover a su destino un archivo que el servidor ya recibió en staging
   - DELETE: eliminar un archivo
-  - CUT: operación atómica que lee, elimina y devuelve el contenido
+  - CUT: operación atómica que saca el archivo de la carpeta y lo deja abierto para enviar
 
-Corre como proceso separado para:
+Corre en un pool de un único hilo del servidor para:
 1. No bloquear el Event Loop del servidor
 2. Serializar escrituras (una a la vez) para evitar corrupción de datos
 
 Las escrituras son PELIGROSAS en concurrencia. Este Worker las procesa
-secuencialmente desde la Queue, garantizando consistencia.
+secuencialmente en ese hilo, garantizando consistencia.
 """
 
+import itertools
 import os
 import shutil
-import signal
-import logging
-from multiprocessing import Queue
 
+from workers import STAGING_DIR, Request, open_regular_file, resolve_safe
 
-def _save_file(shared_folder: str, rel_path: str, data: bytes) -> dict:
-    """Guarda bytes en un archivo dentro de la carpeta compartida."""
-    rel_path = rel_path.lstrip("/")
-    target = os.path.normpath(os.path.join(shared_folder, rel_path))
+# Contador para nombrar archivos en staging (más barato que un uuid4 por request)
+_staging_ids = itertools.count()
+
+# O_TMPFILE sólo sirve si después se puede enlazar el inode, y eso se hace a
+# través de /proc/self/fd (que puede no estar montado, p. ej. en un chroot)
+_USE_O_TMPFILE = hasattr(os, "O_TMPFILE") and os.path.isdir("/proc/self/fd")
 
-    if not os.path.realpath(target).startswith(os.path.realpath(shared_folder)):
-        return {"status": "error", "message": "Ruta no permitida"}
 
-    # Crear directorios intermedios si no existen
-    target_dir = os.path.dirname(target)
-    if target_dir:
-        os.makedirs(target_dir, exist_ok=True)
+def _staging_name(shared_folder: str, kind: str) -> str:
+    return os.path.join(shared_folder, STAGING_DIR, f"{kind}.{os.getpid()}.{next(_staging_ids)}")
 
+
+def open_upload_file(shared_folder: str):
+    """
+    Abre el archivo donde el servidor recibe los bytes de un UPLOAD.
+    En Linux (con /proc montado) usa O_TMPFILE: el archivo no tiene nombre
+    hasta que _save_file lo enlaza, así un upload cortado (o un crash) no
+    deja basura en staging.
+    Devuelve (file, tmp_path); tmp_path es None si el archivo es anónimo.
+    Si staging desapareció (alguien la borró a mano) se vuelve a crear.
+    """
+    staging = os.path.join(shared_folder, STAGING_DIR)
+    os.makedirs(staging, exist_ok=True)
+    if _USE_O_TMPFILE:
+        try:
+            fd = os.open(staging, os.O_TMPFILE | os.O_WRONLY, 0o644)
+            return os.fdopen(fd, "wb"), None
+        except OSError:
+            pass  # El filesystem no soporta O_TMPFILE: temporal con nombre
+    tmp_path = _staging_name(shared_folder, "upload")
+    return open(tmp_path, "wb"), tmp_path
+
+
+def discard_upload_file(f, tmp_path: str):
+    """Cierra el archivo de un UPLOAD y borra su temporal si quedó alguno."""
+    f.close()
+    if tmp_path and os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _save_file(shared_folder: str, request: Request) -> dict:
+    """
+    Mueve el archivo de un UPLOAD (abierto con open_upload_file) a su ruta
+    dentro de la carpeta compartida. os.replace es atómico: nadie ve el
+    archivo a medias. Siempre cierra request.file.
+    """
+    f, tmp_path = request.file, request.tmp_path
+    rel_path = request.path.lstrip("/")
     try:
-        with open(target, "wb") as f:
-            f.write(data)
+        target = resolve_safe(shared_folder, rel_path)
+        if target is None:
+            return {"status": "error", "message": "Ruta no permitida"}
+
+        # Crear directorios intermedios si no existen
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+
+        f.flush()
+        size = os.fstat(f.fileno()).st_size
+        if tmp_path is None:
+            # linkat no pisa destinos existentes: se le da nombre en staging
+            # y el reemplazo atómico lo sigue haciendo os.replace
+            tmp_path = _staging_name(shared_folder, "upload")
+            # Con dst_dir_fd, os.link usa linkat(AT_SYMLINK_FOLLOW), que
+            # sigue el enlace de /proc hasta el inode anónimo
+            dir_fd = os.open(os.path.dirname(tmp_path), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.link(f"/proc/self/fd/{f.fileno()}", os.path.basename(tmp_path),
+                        dst_dir_fd=dir_fd)
+            finally:
+                os.close(dir_fd)
+        os.replace(tmp_path, target)
         return {
             "status": "ok",
-            "message": f"Archivo guardado: {rel_path} ({len(data)} bytes)",
+            "message": f"Archivo guardado: {rel_path} ({size} bytes)",
         }
     except PermissionError:
         return {"status": "error", "message": f"Permiso denegado: {rel_path}"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+    finally:
+        discard_upload_file(f, tmp_path)
 
 
-def _delete_file(shared_folder: str, rel_path: str) -> dict:
+def _delete_file(shared_folder: str, request: Request) -> dict:
     """Elimina un archivo de la carpeta compartida."""
-    rel_path = rel_path.lstrip("/")
-    target = os.path.normpath(os.path.join(shared_folder, rel_path))
-
-    if not os.path.realpath(target).startswith(os.path.realpath(shared_folder)):
+    rel_path = request.path.lstrip("/")
+    target = resolve_safe(shared_folder, rel_path)
+    if target is None:
         return {"status": "error", "message": "Ruta no permitida"}
 
-    if not os.path.exists(target):
-        return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
-
+    # Caso común (un archivo): un único unlink, sin stat previo. Sólo si el
+    # kernel dice que es un directorio se recorre con rmtree
     try:
-        if os.path.isdir(target):
-            shutil.rmtree(target)
-            return {"status": "ok", "message": f"Directorio eliminado: {rel_path}"}
-        else:
-            os.remove(target)
+        try:
+            os.unlink(target)
             return {"status": "ok", "message": f"Archivo eliminado: {rel_path}"}
+        except IsADirectoryError:
+            pass
+        except PermissionError:
+            # macOS/BSD devuelven EPERM (no EISDIR) al hacer unlink de un directorio
+            if not os.path.isdir(target):
+                raise
+        shutil.rmtree(target)
+        return {"status": "ok", "message": f"Directorio eliminado: {rel_path}"}
+    except FileNotFoundError:
+        return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
     except PermissionError:
         return {"status": "error", "message": f"Permiso denegado: {rel_path}"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
-def _cut_file(shared_folder: str, rel_path: str) -> dict:
+def _cut_file(shared_folder: str, request: Request) -> dict:
     """
-    'Cortar' un archivo: lo lee, lo elimina, y devuelve su contenido.
-    Operación ATÓMICA: lee + borra en un solo paso del Worker,
-    evitando que otro cliente vea el archivo a medio borrar.
+    'Cortar' un archivo: lo abre y enseguida lo borra, y devuelve el archivo
+    abierto. Operación ATÓMICA: la entrada del directorio desaparece con el
+    unlink, así ningún otro cliente ve el archivo a medio borrar; el inode
+    sigue vivo hasta que el servidor termina de enviarlo y lo cierra.
     """
-    rel_path = rel_path.lstrip("/")
-    target = os.path.normpath(os.path.join(shared_folder, rel_path))
-
-    if not os.path.realpath(target).startswith(os.path.realpath(shared_folder)):
+    rel_path = request.path.lstrip("/")
+    target = resolve_safe(shared_folder, rel_path)
+    if target is None:
         return {"status": "error", "message": "Ruta no permitida"}
 
-    if not os.path.isfile(target):
-        return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
-
     try:
-        with open(target, "rb") as f:
-            data = f.read()
-        size = len(data)
-        os.remove(target)
+        # Tipo y tamaño salen de un solo fstat sobre el archivo ya abierto
+        opened = open_regular_file(target)
+        if opened is None:
+            return {"status": "error", "message": f"Archivo no encontrado: {rel_path}"}
+        f, size = opened
+        try:
+            os.unlink(target)
+        except BaseException:
+            f.close()
+            raise
         return {
             "status": "ok",
             "message": f"Archivo cortado: {rel_path} ({size} bytes)",
-            "data": data,
             "size": size,
             "path": rel_path,
+            "file": f,
         }
     except PermissionError:
         return {"status": "error", "message": f"Permiso denegado: {rel_path}"}
@@ -104,45 +170,32 @@ def _cut_file(shared_folder: str, rel_path: str) -> dict:
         return {"status": "error", "message": str(e)}
 
 
-def writer_worker(request_queue: Queue, response_queue: Queue, shared_folder: str):
+# Acción -> handler(shared_folder, request): una búsqueda en dict en vez de
+# una cascada de if/elif
+WRITE_DISPATCH = {
+    "UPLOAD": _save_file,
+    "DELETE": _delete_file,
+    "CUT": _cut_file,
+}
+
+
+def process_write(shared_folder: str, request: Request) -> dict:
     """
-    Proceso principal del Worker de Escritura.
-    Procesa peticiones de forma SECUENCIAL (una a la vez) para evitar
-    problemas de concurrencia en escritura.
-    Se detiene al recibir None.
+    Procesa una petición de escritura y devuelve el resultado.
+    El servidor la ejecuta en un pool de UN solo hilo, así las escrituras
+    siguen siendo SECUENCIALES (una a la vez). shared_folder llega ya
+    resuelto con realpath y request.action en mayúsculas.
     """
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
-
-    shared_folder = os.path.abspath(shared_folder)
-    logging.info(f"[WRITER] Iniciado. Carpeta: {shared_folder}")
+    action = request.action
+    handler = WRITE_DISPATCH.get(action)
 
     try:
-        while True:
-            request = request_queue.get()
-
-            if request is None:
-                break
-
-            req_id = request.get("id")
-            action = request.get("action", "").upper()
-            path = request.get("path", "")
-
-            try:
-                if action == "UPLOAD":
-                    data = request.get("data", b"")
-                    result = _save_file(shared_folder, path, data)
-                elif action == "DELETE":
-                    result = _delete_file(shared_folder, path)
-                elif action == "CUT":
-                    result = _cut_file(shared_folder, path)
-                else:
-                    result = {"status": "error", "message": f"Acción desconocida: {action}"}
-            except Exception as e:
-                result = {"status": "error", "message": f"Error interno: {e}"}
-
-            result["id"] = req_id
-            result["action"] = action
-            response_queue.put(result)
+        if handler is None:
+            result = {"status": "error", "message": f"Acción desconocida: {action}"}
+        else:
+            result = handler(shared_folder, request)
+    except Exception as e:
+        result = {"status": "error", "message": f"Error interno: {e}"}
 
-    finally:
-        logging.info("[WRITER] Detenido.")
+    result["action"] = action
+    return result